@@ -28,6 +28,7 @@ _NODE_CLASSES = [
     DVB_BlendedTransition,
     DVB_UnwrapFrameSet,
     DVB_ConcatFrameSets,
+    DVB_ConcatMultipleFrameSets,
     DVB_MergeFrames,
     DVB_FadeFromBlack,
     DVB_FadeToBlack,
@@ -41,6 +42,7 @@ _NODE_CLASSES = [
     DVB_ForEachFilename,
     DVB_ForEachCheckpoint,
     DVB_LoadImageFromPath,
+    DVB_LoadFrameSetFromDirectory,
     DVB_Reverse,
     DVB_FrameSetRepeat,
     DVB_FrameSetDimensionsScaled,
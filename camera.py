@@ -2,20 +2,22 @@
 
 import math
 
+import torch
+
 from .categories import *
 from .core import *
+from .core.affine import crop_matrices, translation_matrices, rotation_crop_matrices, resample_frames
 
 
 
 class BatchCameraMotion:
-    def __init__(self, frames: FrameSet, output_width, output_height, motion_function, frame_function):
+    def __init__(self, frames: FrameSet, output_width, output_height, motion_function, matrix_function):
         assert isinstance(frames, FrameSet)
-        self._proc = DVB_ImageBatchProcessor(frames.tensor)
         self._frames = frames
         self._output_width = output_width
         self._output_height = output_height
         self._motion_function = motion_function
-        self._frame_function = frame_function
+        self._matrix_function = matrix_function
         self._indices = frames.indices
         self._first_index = frames.first_index
         self._last_index = frames.last_index
@@ -23,56 +25,64 @@ class BatchCameraMotion:
 
     def execute(self):
         gc_comfyui()
-
-        def do_recalc(n: int, total: int, image: DVB_Image):
-            index = self._indices[n]
+        width, height = self._frame_dims
+        factors = list()
+        for index in self._indices:
             if self._last_index == self._first_index:
                 factor = 0.5
             else:
                 factor = float(index - self._first_index) / (self._last_index - self._first_index)
-            factor = max(0.0, min(1.0, self._motion_function(factor)))
-            return self._frame_function(image, factor, self._output_width, self._output_height)
+            factors.append(max(0.0, min(1.0, self._motion_function(factor))))
+        matrices = self._matrix_function(width, height, torch.tensor(factors, dtype=torch.float64),
+                                         self._output_width, self._output_height)
+        proc = DVB_ImageBatchProcessor(self._frames.tensor, params={"matrix": matrices},
+                                       output_width=self._output_width, output_height=self._output_height)
+        return (FrameSet(proc.process(resample_frames), self._frames.framerate, self._frames.indices),)
 
-        return (FrameSet(self._proc.process(do_recalc), self._frames.framerate, self._frames.indices),)
 
-
-def zoom_frame(image: DVB_Image, f, o_width, o_height):
-    w = (image.width - o_width) * f + o_width
-    h = (image.height - o_height) * f + o_height
-    c = image.quad.center
-    return image.crop(c.x - w * 0.5, c.y - h * 0.5, c.x + w * 0.5, c.y + h * 0.5).resize(o_width,
-                                                                                         o_height)
+def zoom_matrices(width, height, factors, o_width, o_height):
+    w = (width - o_width) * factors + o_width
+    h = (height - o_height) * factors + o_height
+    c = Quad2d(0.0, 0.0, width, height).center
+    return crop_matrices(c.x - w * 0.5, c.y - h * 0.5, c.x + w * 0.5, c.y + h * 0.5, o_width, o_height)
 
 
 def make_pan_function(direction_x: float, direction_y: float):
-    move_dir = Vector2d(direction_x, direction_y).normalized()
+    move_dir = Vector2d(direction_x, direction_y)
 
-    def _pan_func(image: DVB_Image, f, o_width, o_height):
-        input_width = image.width
-        input_height = image.height
+    def _pan_func(input_width, input_height, factors, o_width, o_height):
+        centered = ((input_width - o_width) * 0.5, (input_height - o_height) * 0.5)
         if input_height < o_height or input_width < o_width:
             print("WARNING: Cannot pan - output larger than input!")
-            return (image,)
+            return translation_matrices(torch.full_like(factors, centered[0]), centered[1])
         if direction_x == 0.0 and direction_y == 0.0:
             print("WARNING: Cannot pan - no direction!")
-            return (image,)
+            return translation_matrices(torch.full_like(factors, centered[0]), centered[1])
         space = Quad2d(o_width * 0.5, o_height * 0.5, input_width - o_width * 0.5,
                        input_height - o_height * 0.5)
-        a, b = space.calculate_intersections(space.center, move_dir)
+        a, b = space.calculate_intersections(space.center, move_dir.normalized())
         move_vector = b.sub(a).align(move_dir)
-
         start_move = space.center.sub(move_vector.multiply(0.5))
-
         start_quad = Quad2d(start_move.x - o_width * 0.5, start_move.y - o_height * 0.5,
                             start_move.x + o_width * 0.5, start_move.y + o_height * 0.5)
-        subimage_quad = start_quad.add(move_vector.multiply(f))
-        return image.crop(round(subimage_quad.mincorner.x), round(subimage_quad.mincorner.y),
-                          round(subimage_quad.mincorner.x) + o_width,
-                          round(subimage_quad.mincorner.y) + o_height)
+        moves = Vector2dArray.repeat(move_vector, len(factors)).multiply(factors.numpy())
+        path = Quad2dArray.repeat(start_quad, len(factors)).add(moves)
+        return translation_matrices(torch.from_numpy(path.mincorner.x), torch.from_numpy(path.mincorner.y))
 
     return _pan_func
 
 
+def make_roll_function(degrees: float):
+    def _roll_func(width, height, factors, o_width, o_height):
+        c_x = round(width * 0.5)
+        c_y = round(height * 0.5)
+        a = c_x - o_width // 2
+        b = c_y - o_height // 2
+        return rotation_crop_matrices(factors * degrees, width, height, a, b)
+
+    return _roll_func
+
+
 def _recalc_motion_factor_to_loopable(f, total_frames):
     return f * (total_frames) / (total_frames + 1.0)
 
@@ -96,6 +106,7 @@ class DVB_Zoom:
     RETURN_NAMES = ("frames",)
     FUNCTION = "result"
 
+    @cached_result
     def result(self, frames: FrameSet, output_width: int, output_height: int, direction):
         def motion(f):
             if direction == "in":
@@ -103,7 +114,7 @@ class DVB_Zoom:
             else:
                 return f
 
-        return BatchCameraMotion(frames, output_width, output_height, motion, zoom_frame).execute()
+        return BatchCameraMotion(frames, output_width, output_height, motion, zoom_matrices).execute()
 
 
 class DVB_LinearCameraPan:
@@ -128,6 +139,7 @@ class DVB_LinearCameraPan:
     RETURN_NAMES = ("frames",)
     FUNCTION = "result"
 
+    @cached_result
     def result(self, frames: FrameSet, output_width: int, output_height: int, direction_x: float,
                direction_y: float, pan_mode: str):
         def motion(f):
@@ -162,21 +174,12 @@ class DVB_LinearCameraRoll:
     RETURN_NAMES = ("frames",)
     FUNCTION = "result"
 
-
+    @cached_result
     def result(self, frames: FrameSet, output_width: int, output_height: int, degrees: float):
         def motion(f):
             return f
 
-        def frame_func(image: DVB_Image, f, o_width, o_height):
-            w = image.width
-            h = image.height
-            c_x = round(w * 0.5)
-            c_y = round(h * 0.5)
-            a = c_x - o_width // 2
-            b = c_y - o_height // 2
-            return image.rotate(f * degrees).crop(a, b, a + o_width, b + o_height)
-
-        return BatchCameraMotion(frames, output_width, output_height, motion, frame_func).execute()
+        return BatchCameraMotion(frames, output_width, output_height, motion, make_roll_function(degrees)).execute()
 
 
 class DVB_ZoomSine:
@@ -200,6 +203,7 @@ class DVB_ZoomSine:
     RETURN_NAMES = ("frames",)
     FUNCTION = "result"
 
+    @cached_result
     def result(self, frames: FrameSet, output_width: int, output_height: int, period_seconds, phase_seconds):
         def motion(f):
             f = _recalc_motion_factor_to_loopable(f, frames.indexed_length)
@@ -208,7 +212,7 @@ class DVB_ZoomSine:
             x = (t + phase_seconds) * math.pi * 2.0 / period_seconds
             return math.sin(x) * 0.5 + 0.5
 
-        return BatchCameraMotion(frames, output_width, output_height, motion, zoom_frame).execute()
+        return BatchCameraMotion(frames, output_width, output_height, motion, zoom_matrices).execute()
 
 
 class DVB_SineCameraPan:
@@ -235,7 +239,7 @@ class DVB_SineCameraPan:
     RETURN_NAMES = ("frames",)
     FUNCTION = "result"
 
-
+    @cached_result
     def result(self, frames: FrameSet, output_width: int, output_height: int, direction_x: float,
                direction_y: float, pan_mode: str, period_seconds, phase_seconds):
         def motion(f):
@@ -273,6 +277,7 @@ class DVB_SineCameraRoll:
     RETURN_NAMES = ("frames",)
     FUNCTION = "result"
 
+    @cached_result
     def result(self, frames: FrameSet, output_width: int, output_height: int, degrees: float, period_seconds,
                phase_seconds):
         def motion(f):
@@ -282,13 +287,4 @@ class DVB_SineCameraRoll:
             x = (t + phase_seconds) * math.pi * 2.0 / period_seconds
             return math.sin(x) * 0.5 + 0.5
 
-        def frame_func(image: DVB_Image, f, o_width, o_height):
-            w = image.width
-            h = image.height
-            c_x = round(w * 0.5)
-            c_y = round(h * 0.5)
-            a = c_x - o_width // 2
-            b = c_y - o_height // 2
-            return image.rotate(f * degrees).crop(a, b, a + o_width, b + o_height)
-
-        return BatchCameraMotion(frames, output_width, output_height, motion, frame_func).execute()
+        return BatchCameraMotion(frames, output_width, output_height, motion, make_roll_function(degrees)).execute()
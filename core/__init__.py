@@ -1,9 +1,11 @@
-from .batch_processing import DVB_ImageBatchProcessor
+from .batch_processing import DVB_ImageBatchProcessor, batch_capable
 from .dvb_image import DVB_Image
 from .frameset import FrameSet
 from .framerate import FrameRate
 from .config import DVB_Config
-from .utility import hashed_as_strings, ForEachState
+from .utility import hashed_as_strings, ForEachState, worker_id
 from .err import on_node_error, raise_error
-from .vector import Quad2d, Vector2d
-from .memory import gc_comfyui
+from .vector import Quad2d, Vector2d, Quad2dArray, Vector2dArray
+from .memory import gc_comfyui, memory_policy
+from .result_cache import cached_result
+from .file_index import file_fingerprint
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import torch
+import torch.nn.functional as F
+from torch import Tensor
+
+from .batch_processing import batch_capable
+
+_PREFILTER_SCALE = 1.5
+
+
+def _matrices(a, b, c, d, e, f) -> Tensor:
+    values = torch.broadcast_tensors(*[torch.as_tensor(v, dtype=torch.float64) for v in (a, b, c, d, e, f)])
+    return torch.stack(values, dim=-1).view(-1, 2, 3)
+
+
+# The matrix builders below take floats or tensors (one value per frame) and return [N,2,3] matrices
+
+def translation_matrices(x, y) -> Tensor:
+    return _matrices(1.0, 0.0, x, 0.0, 1.0, y)
+
+
+def crop_matrices(x1, y1, x2, y2, output_width: int, output_height: int) -> Tensor:
+    # maps the output frame onto the (sub pixel) crop box x1,y1 - x2,y2 of the input frame
+    return _matrices((x2 - x1) / output_width, 0.0, x1, 0.0, (y2 - y1) / output_height, y1)
+
+
+def rotation_crop_matrices(degrees_ccw, width: int, height: int, x: float, y: float) -> Tensor:
+    # rotates the input frame around its center (same direction as PIL rotate) and crops at x,y
+    a = torch.deg2rad(torch.as_tensor(degrees_ccw, dtype=torch.float64))
+    cos_a = torch.cos(a)
+    sin_a = torch.sin(a)
+    dx = x - width * 0.5
+    dy = y - height * 0.5
+    return _matrices(cos_a, -sin_a, cos_a * dx - sin_a * dy + width * 0.5,
+                     sin_a, cos_a, sin_a * dx + cos_a * dy + height * 0.5)
+
+
+def _sample(frames: Tensor, matrices: Tensor, output_width: int, output_height: int) -> Tensor:
+    _, height, width, _ = frames.shape
+    u = torch.arange(output_width, device=frames.device, dtype=frames.dtype) + 0.5
+    v = torch.arange(output_height, device=frames.device, dtype=frames.dtype) + 0.5
+    grid_v, grid_u = torch.meshgrid(v, u, indexing="ij")
+    coords = torch.stack((grid_u, grid_v, torch.ones_like(grid_u)), dim=-1)
+    source = torch.einsum("hwk,nik->nhwi", coords, matrices)
+    scale = torch.tensor((2.0 / width, 2.0 / height), device=frames.device, dtype=frames.dtype)
+    grid = source * scale - 1.0
+    output = F.grid_sample(frames.permute(0, 3, 1, 2), grid, mode="bilinear", padding_mode="zeros",
+                           align_corners=False)
+    return output.permute(0, 2, 3, 1).contiguous()
+
+
+def _prefilter_levels(matrices: Tensor) -> Tensor:
+    # power of two level to area downscale the input to before sampling, so that one bilinear tap per output
+    # pixel does not skip source pixels (aliasing) when the matrix shrinks the frame by more than 1.5x
+    scales = torch.linalg.det(matrices[:, :, :2]).abs().sqrt()
+    levels = torch.log2(scales.clamp(min=1.0)).round().clamp(min=1)
+    return torch.where(scales > _PREFILTER_SCALE, levels, torch.zeros_like(levels)).long()
+
+
+def affine_resample(frames: Tensor, matrices: Tensor, output_width: int, output_height: int) -> Tensor:
+    # frames [N,H,W,C], matrices [N,2,3] mapping output pixel coordinates to input pixel coordinates
+    n, height, width, _ = frames.shape
+    matrices = matrices.to(device=frames.device, dtype=frames.dtype)
+    levels = _prefilter_levels(matrices)
+    if not levels.any():
+        return _sample(frames, matrices, output_width, output_height)
+    output = None
+    for level in levels.unique().tolist():
+        selected = (levels == level).nonzero().squeeze(1)
+        source = frames[selected]
+        level_matrices = matrices[selected]
+        if level > 0:
+            size = (max(1, round(height / 2 ** level)), max(1, round(width / 2 ** level)))
+            source = F.interpolate(source.permute(0, 3, 1, 2), size=size, mode="area").permute(0, 2, 3, 1)
+            level_matrices = level_matrices * torch.tensor((size[1] / width, size[0] / height),
+                                                           device=frames.device, dtype=frames.dtype).view(1, 2, 1)
+        r = _sample(source, level_matrices, output_width, output_height)
+        if len(selected) == n:
+            return r
+        if output is None:
+            output = r.new_empty((n,) + tuple(r.shape[1:]))
+        output[selected] = r
+    return output
+
+
+@batch_capable
+def resample_frames(offset: int, total: int, frames: Tensor, matrix: Tensor, output_width: int,
+                    output_height: int) -> Tensor:
+    return affine_resample(frames, matrix, output_width, output_height)
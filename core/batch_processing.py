@@ -1,19 +1,101 @@
 # -*- coding: utf-8 -*-
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Sequence
+
 import torch
 
+from .config import DVB_Config
 from .dvb_image import DVB_Image
 
 
+def batch_capable(proc_fun):
+    # batch capable functions are called as proc_fun(offset, total, frames, **params, **extra_args) with an
+    # [N,H,W,C] tensor of frames starting at offset and one value per frame in each params tensor - they
+    # return a tensor holding one output frame per input frame
+    proc_fun.batch_capable = True
+    return proc_fun
+
+
+def is_batch_capable(proc_fun) -> bool:
+    return getattr(proc_fun, "batch_capable", False)
+
+
+def _chunk_size_for_budget(inputs: torch.Tensor, budget_mb: float) -> int:
+    if len(inputs) == 0:
+        return 1
+    # a frame in flight holds its float input, an 8-bit PIL copy and the processed result
+    frame_bytes = inputs[0].numel() * (2 * inputs.element_size() + 1)
+    return max(1, int(budget_mb * 1024 * 1024) // frame_bytes)
+
+
+def configured_chunk_size(inputs: torch.Tensor) -> int:
+    config = DVB_Config()
+    chunk_size = config.get("processing.chunk_size", 0)
+    if chunk_size <= 0:
+        chunk_size = _chunk_size_for_budget(inputs, config.get("processing.memory_budget_mb", 1024))
+    return chunk_size
+
+
 class DVB_ImageBatchProcessor:
-    def __init__(self, inputs: torch.Tensor, **extra_args):
+    def __init__(self, inputs: torch.Tensor, params: Dict[str, Sequence] = None, workers: int = None,
+                 chunk_size: int = None, **extra_args):
+        config = DVB_Config()
+        if workers is None:
+            workers = config.get("processing.workers", 1)
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        if chunk_size is None or chunk_size <= 0:
+            chunk_size = configured_chunk_size(inputs)
+        self._workers = workers
+        self._chunk_size = chunk_size
         self._size = len(inputs)
         self._tensor = inputs
+        self._params = {name: torch.as_tensor(values) for name, values in (params or {}).items()}
+        for name, values in self._params.items():
+            if len(values) != self._size:
+                raise Exception("Parameter {} has {} values for {} frames".format(name, len(values), self._size))
         self._extra_args = extra_args
 
+    def _frame_params(self, i: int):
+        params = dict()
+        for name, values in self._params.items():
+            value = values[i]
+            params[name] = value.item() if value.dim() == 0 else value
+        return params
+
+    def _chunks(self):
+        for start in range(0, self._size, self._chunk_size):
+            yield start, min(start + self._chunk_size, self._size)
+
+    def _process_batch(self, proc_fun) -> torch.Tensor:
+        if self._size == 0:
+            return proc_fun(0, 0, self._tensor, **self._params, **self._extra_args)
+        output = None
+        for start, end in self._chunks():
+            params = {name: values[start:end] for name, values in self._params.items()}
+            r = proc_fun(start, self._size, self._tensor[start:end], **params, **self._extra_args)
+            if len(r) != end - start:
+                raise Exception("Batch processing returned {} frames for {} inputs".format(len(r), end - start))
+            if output is None:
+                if end == self._size:
+                    return r
+                output = r.new_empty((self._size,) + tuple(r.shape[1:]))
+            output[start:end] = r
+        return output
+
     def process(self, proc_fun) -> torch.Tensor:
-        output = list()
-        for i in range(self._size):
-            r = proc_fun(i, self._size, DVB_Image(self._tensor[i]), **self._extra_args)
+        if is_batch_capable(proc_fun):
+            return self._process_batch(proc_fun)
+
+        def _proc_frame(i: int):
+            r = proc_fun(i, self._size, DVB_Image(self._tensor[i]), **self._frame_params(i), **self._extra_args)
             if isinstance(r, DVB_Image):
-                output.append(r)
-        return DVB_Image.join_to_tensor_data(output)
+                return r.tensor_image
+            return None
+
+        if self._workers > 1 and self._size > 1:
+            with ThreadPoolExecutor(max_workers=min(self._workers, self._size)) as executor:
+                results = (r for start, end in self._chunks() for r in executor.map(_proc_frame, range(start, end)))
+                return DVB_Image.join_to_tensor_data(results, self._size)
+        return DVB_Image.join_to_tensor_data(map(_proc_frame, range(self._size)), self._size)
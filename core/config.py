@@ -30,7 +30,30 @@ _EMBEDDED_CONFIGURATION = {
             "DVB": "🎭"
         }
     },
-
+    "processing": {
+        "workers": 1,
+        "chunk_size": 0,
+        "memory_budget_mb": 1024
+    },
+    "memory": {
+        "gc_mode": "always",
+        "gc_threshold_mb": 8192,
+        "gc_every_n": 10
+    },
+    "cache": {
+        "enabled": False,
+        "directory": "",
+        "max_size_mb": 10240,
+        "fingerprint_mode": "sampled"
+    },
+    "io": {
+        "fingerprint_mode": "cached",
+        "load_workers": 0
+    },
+    "foreach": {
+        "lease_seconds": 3600,
+        "max_attempts": 3
+    }
 }
 
 _config_data = None
@@ -65,7 +88,7 @@ class DVB_Config:
                 changed = True
                 config[key] = default_config[key]
             elif isinstance(default_config[key], dict):
-                changed = changed or self._merge_with_defaults(config[key], default_config[key])
+                changed = self._merge_with_defaults(config[key], default_config[key]) or changed
         return changed
 
     def get(self, key: str, default=None):
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import math
+import weakref
+
+import torch
+from torch import Tensor
+
+MODES = ("sampled", "full")
+
+_SAMPLED_PIXELS = 4096
+
+# per-frame digests by id of the tensor - dropped with the tensor and recomputed if it is modified in place
+_tensor_digests = dict()
+
+
+def _digest(*parts) -> str:
+    m = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        m.update(part if isinstance(part, bytes) else str(part).encode(encoding="utf-8"))
+    return m.hexdigest()
+
+
+def _compute_frame_digests(tensor: Tensor, mode: str):
+    if mode not in MODES:
+        raise Exception("Unknown fingerprint mode: {}".format(mode))
+    if len(tensor) == 0:
+        return []
+    header = str((tuple(tensor.shape[1:]), str(tensor.dtype)))
+    if mode == "full":
+        data = tensor.contiguous().cpu().numpy()
+        return [_digest(header, data[i].tobytes()) for i in range(len(tensor))]
+    stride = max(1, int(math.sqrt(tensor.shape[1] * tensor.shape[2] / _SAMPLED_PIXELS)))
+    samples = tensor[:, ::stride, ::stride].contiguous().cpu().numpy()
+    # row and column sums see every pixel and change when content moves, also off the sample grid
+    row_sums = tensor.sum(dim=2, dtype=torch.float64).cpu().numpy()
+    column_sums = tensor.sum(dim=1, dtype=torch.float64).cpu().numpy()
+    return [_digest(header, samples[i].tobytes(), row_sums[i].tobytes(), column_sums[i].tobytes())
+            for i in range(len(tensor))]
+
+
+def frame_digests(tensor: Tensor, mode: str = "sampled"):
+    # one digest per frame of an [N,H,W,C] tensor - "full" hashes all pixels, "sampled" a strided subset of the
+    # pixels together with the per-channel row and column sums of each frame
+    key = id(tensor)
+    entry = _tensor_digests.get(key)
+    if entry is None or entry[0] != tensor._version:
+        if entry is None:
+            weakref.finalize(tensor, _tensor_digests.pop, key, None)
+        entry = (tensor._version, dict())
+        _tensor_digests[key] = entry
+    digests = entry[1].get(mode)
+    if digests is None:
+        digests = _compute_frame_digests(tensor, mode)
+        entry[1][mode] = digests
+    return digests
+
+
+def combined_digest(*parts) -> str:
+    return _digest(*map(lambda part: str(part) + "|", parts))
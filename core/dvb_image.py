@@ -3,9 +3,11 @@ from functools import cache
 
 import numpy
 import torch
-from PIL import Image, ImageFilter, ImageEnhance
+from PIL import Image
 from PIL.ImageDraw import ImageDraw
 from torch import Tensor
+from . import digests
+from . import image_ops
 from .vector import *
 
 def _convert_tensor_image_to_pil(tensor_image) -> Image:
@@ -16,18 +18,41 @@ def _convert_from_pil_to_tensor(pil_image):
     return torch.from_numpy(numpy.array(pil_image).astype(numpy.float32) / 255.0)
 
 
+def _open_image(file_path, size=None):
+    image = Image.open(file_path)
+    if size is None:
+        return image
+    size = DVB_Image.target_size(image.width, image.height, *size)
+    # let the decoder skip detail that is thrown away by the resize anyway (JPEG DCT scaling, integer reduce)
+    image.draft(None, size)
+    factor = min(image.width // size[0], image.height // size[1])
+    if factor >= 2 and image.mode in ("L", "LA", "RGB", "RGBA"):
+        image = image.reduce(factor)
+    if image.size != size:
+        image = image.resize(size)
+    return image
+
+
 class DVB_Image:
-    def __init__(self, tensor_image=None, pil_image=None, file_path=None, with_alpha=False):
+    def __init__(self, tensor_image=None, pil_image=None, file_path=None, with_alpha=False, size=None):
         if tensor_image is None and pil_image is None and file_path is None:
             raise Exception("No Image provided!")
 
         self._tensor_image = tensor_image
         self._pil_image = pil_image
         if pil_image is None and file_path is not None:
-            self._pil_image = Image.open(file_path)
+            self._pil_image = _open_image(file_path, size)
         self._with_alpha = with_alpha
         self._image_draw = None
         self._numpy = None
+        self._digests = dict()
+
+    def fingerprint(self, mode: str = "sampled") -> str:
+        digest = self._digests.get(mode)
+        if digest is None:
+            digest = digests.frame_digests(self.tensor_image.unsqueeze(0), mode)[0]
+            self._digests[mode] = digest
+        return digest
 
     @property
     def quad(self):
@@ -35,20 +60,26 @@ class DVB_Image:
 
 
     @classmethod
-    def join_to_tensor_data(cls, images):
-        def _to_tensor(img):
-            t = img
+    def join_to_tensor_data(cls, images, count: int = None):
+        if count is None:
+            images = list(images)
+            count = len(images)
+        tensor = None
+        n = 0
+        for image in images:
+            t = image
+            if isinstance(image, cls):
+                t = image.tensor_image
             if t is None:
-                return None
-            if isinstance(img, cls):
-                t = img.tensor_image
-            return t
-        image_tensors = [_to_tensor(image) for image in images]
-
-        tensor = torch.stack(image_tensors)
-        #arr = numpy.array(image_tensors)
-        #tensor = torch.from_numpy(arr)
-        assert len(tensor) == len(images)
+                continue
+            if tensor is None:
+                tensor = t.new_empty((count,) + tuple(t.shape))
+            tensor[n] = t
+            n += 1
+        if tensor is None:
+            raise Exception("No images to join!")
+        if n < count:
+            tensor = tensor[:n]
         return tensor
 
     @classmethod
@@ -120,12 +151,10 @@ class DVB_Image:
         return self._image_draw
 
     def change_brightness(self, factor):
-        enhancer = ImageEnhance.Brightness(self.pil_image)
-        return DVB_Image(pil_image=enhancer.enhance(factor))
+        return DVB_Image(tensor_image=image_ops.brightness(self.tensor_image, factor))
 
     def change_contrast(self, factor):
-        enhancer = ImageEnhance.Contrast(self.pil_image)
-        return DVB_Image(pil_image=enhancer.enhance(factor))
+        return DVB_Image(tensor_image=image_ops.contrast(self.tensor_image, factor))
 
     def numpy_array(self):
         return numpy.array(self.pil_image)
@@ -139,35 +168,42 @@ class DVB_Image:
 
     def blend(self, other, weight_self: float = 0.5, weight_other: float = 0.5):
         alpha = 1.0 - weight_self / (weight_other + weight_self)
-        return DVB_Image(pil_image=Image.blend(self.pil_image, other.pil_image, alpha))
+        return DVB_Image(tensor_image=image_ops.blend(self.tensor_image, other.tensor_image, alpha))
 
     def blur(self, amount):
-        return DVB_Image(pil_image=self.pil_image.filter(ImageFilter.GaussianBlur(amount)))
+        return DVB_Image(tensor_image=image_ops.gaussian_blur(self.tensor_image, amount))
 
     def adjust_colors(self, red_factor=1.0, green_factor=1.0, blue_factor=1.0):
-        # newRed   = 1.1*oldRed  +  0*oldGreen    +  0*oldBlue  + constant
-        # newGreen = 0*oldRed    +  0.9*OldGreen  +  0*OldBlue  + constant
-        # newBlue  = 0*oldRed    +  0*OldGreen    +  1*OldBlue  + constant
-        matrix = (red_factor, 0, 0, 0,
-                  0, green_factor, 0, 0,
-                  0, 0, blue_factor, 0)
-        return DVB_Image(pil_image=self.pil_image.convert("RGB", matrix))
+        # newRed   = 1.1*oldRed  +  0*oldGreen    +  0*oldBlue
+        # newGreen = 0*oldRed    +  0.9*OldGreen  +  0*OldBlue
+        # newBlue  = 0*oldRed    +  0*OldGreen    +  1*OldBlue
+        matrix = (red_factor, 0, 0,
+                  0, green_factor, 0,
+                  0, 0, blue_factor)
+        return DVB_Image(tensor_image=image_ops.color_matrix(self.tensor_image, matrix))
 
     @classmethod
     def empty(cls, width, height, mode):
         return DVB_Image(pil_image=Image.new(mode, (width, height), 0))
 
     @classmethod
-    def from_file(cls, file_path):
-        return DVB_Image(pil_image=Image.open(file_path))
+    def from_file(cls, file_path, resize_width=0, resize_height=0):
+        return DVB_Image(file_path=file_path, size=(resize_width, resize_height))
+
+    @staticmethod
+    def target_size(width, height, resize_width=0, resize_height=0):
+        if resize_width <= 0 and resize_height <= 0:
+            return width, height
+        ratio = width / height
+        if resize_height <= 0:
+            resize_height = round(resize_width / ratio)
+        elif resize_width <= 0:
+            resize_width = round(resize_height * ratio)
+        return resize_width, resize_height
 
     def resize(self, resize_width=0, resize_height=0):
         if resize_width > 0 or resize_height > 0:
-            ratio = self.width / self.height
-            if resize_height <= 0:
-                resize_height = round(resize_width / ratio)
-            elif resize_width <= 0:
-                resize_width = round(resize_height * ratio)
-            return DVB_Image(pil_image=self.pil_image.resize((resize_width, resize_height)))
+            size = DVB_Image.target_size(self.width, self.height, resize_width, resize_height)
+            return DVB_Image(pil_image=self.pil_image.resize(size))
         else:
             return self
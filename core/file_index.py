@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .config import DVB_Config
+from .statestore import TEMP_PATH
+
+MODES = ("cached", "full")
+
+_MAX_ENTRIES = 10000
+_BLOCK_SIZE = 1024 * 1024
+
+# files modified this recently are hashed but not indexed, as a same size rewrite within the timestamp resolution
+# (coarse on network mounts) would leave size, mtime and inode unchanged
+_RACY_INTERVAL_NS = 2 * 1000 * 1000 * 1000
+
+
+def _file_digest(path: str) -> str:
+    m = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+            m.update(block)
+    return m.hexdigest()
+
+
+class FileFingerprintIndex:
+    # remembers the digest of each file together with its size, mtime and inode - the file is only read again
+    # when one of those changes. New entries are appended as single json lines (later lines win), so a miss does
+    # not rewrite the index and processes sharing it do not overwrite each other's entries.
+    def __init__(self, filepath: str):
+        self._filepath = filepath
+        self._lock = threading.Lock()
+        self._entries = None
+        self._lines = 0
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            self._entries = dict()
+            try:
+                with open(self._filepath, "rb") as f:
+                    for line in f:
+                        self._lines += 1
+                        try:
+                            path, entry = json.loads(line)
+                        except (ValueError, TypeError):
+                            continue
+                        self._entries.pop(path, None)
+                        self._entries[path] = entry
+            except OSError:
+                pass
+        return self._entries
+
+    def _append(self, path: str, entry: list):
+        os.makedirs(os.path.dirname(self._filepath), exist_ok=True)
+        with open(self._filepath, "ab") as f:
+            f.write((json.dumps([path, entry]) + "\n").encode(encoding="utf-8"))
+        self._lines += 1
+        if self._lines > 2 * _MAX_ENTRIES:
+            self._compact()
+
+    def _compact(self):
+        while len(self._entries) > _MAX_ENTRIES:
+            del self._entries[next(iter(self._entries))]
+        tmp_path = self._filepath + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for path, entry in self._entries.items():
+                f.write((json.dumps([path, entry]) + "\n").encode(encoding="utf-8"))
+        os.replace(tmp_path, self._filepath)
+        self._lines = len(self._entries)
+
+    def fingerprint(self, path: str, mode: str = "cached") -> str:
+        if mode not in MODES:
+            raise Exception("Unknown fingerprint mode: {}".format(mode))
+        if mode == "full":
+            return _file_digest(path)
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+        if time.time_ns() - stat.st_mtime_ns < _RACY_INTERVAL_NS:
+            return _file_digest(path)
+        with self._lock:
+            entry = self._load().get(path)
+        if entry is not None and entry[:3] == signature:
+            return entry[3]
+        digest = _file_digest(path)
+        entry = signature + [digest]
+        with self._lock:
+            entries = self._load()
+            entries.pop(path, None)
+            entries[path] = entry
+            self._append(path, entry)
+        return digest
+
+
+_index = None
+
+
+def file_fingerprint(path: str) -> str:
+    global _index
+    if _index is None:
+        _index = FileFingerprintIndex(os.path.join(TEMP_PATH, "file_fingerprints.jsonl"))
+    return _index.fingerprint(path, DVB_Config().get("io.fingerprint_mode", "cached"))
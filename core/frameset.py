@@ -1,13 +1,40 @@
 # -*- coding: utf-8 -*-
 from functools import cache
-from typing import List
+from typing import List, Sequence, Tuple
 
+import torch
 from torch import Tensor
 
+from . import digests
+from . import image_ops
+from .batch_processing import configured_chunk_size
 from .dvb_image import DVB_Image
 from .framerate import FrameRate
 
 
+def _gather_frames(sources: Sequence[Tensor], plan: Sequence[Tuple[int, int]]) -> Tensor:
+    # plan holds one (source number, row in source) pair per output frame - output is allocated once
+    template = next((t for t in sources if len(t) > 0), sources[0])
+    output = template.new_empty((len(plan),) + tuple(template.shape[1:]))
+    if not plan:
+        return output
+    # copies each run of output frames taken from the same source straight into its slice of the output
+    start = 0
+    for end in range(1, len(plan) + 1):
+        if end < len(plan) and plan[end][0] == plan[start][0]:
+            continue
+        source = sources[plan[start][0]]
+        first_row = plan[start][1]
+        rows = [row for _, row in plan[start:end]]
+        if rows == list(range(first_row, first_row + end - start)):
+            output[start:end].copy_(source[first_row:first_row + end - start])
+        else:
+            torch.index_select(source, 0, torch.tensor(rows, dtype=torch.long, device=source.device),
+                               out=output[start:end])
+        start = end
+    return output
+
+
 class IndexedImage:
     def __init__(self, image: DVB_Image, index: int):
         assert isinstance(image, DVB_Image)
@@ -15,21 +42,103 @@ class IndexedImage:
         self.index = index
 
 
+class FrameMap:
+    # maps each frame to a row of a shared tensor - optionally blended with a second row (weight > 0) and
+    # scaled in brightness (gain != 1)
+    def __init__(self, rows: Tensor, blend_rows: Tensor = None, blend_weights: Tensor = None, gains: Tensor = None):
+        self.rows = rows
+        self.blend_rows = blend_rows
+        self.blend_weights = blend_weights
+        self.gains = gains
+
+    @classmethod
+    def identity(cls, length: int):
+        return FrameMap(torch.arange(length))
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def is_blended(self):
+        return self.blend_weights is not None
+
+    @property
+    def has_recipes(self):
+        return self.is_blended or self.gains is not None
+
+    def select(self, positions):
+        if not self.is_blended:
+            frame_map = FrameMap(self.rows[positions])
+        else:
+            frame_map = FrameMap(self.rows[positions], self.blend_rows[positions], self.blend_weights[positions])
+        if self.gains is not None:
+            frame_map.gains = self.gains[positions]
+        return frame_map
+
+    def with_gains(self, gains: Tensor):
+        if self.gains is not None:
+            gains = self.gains * gains
+        return FrameMap(self.rows, self.blend_rows, self.blend_weights, gains)
+
+    def digests(self, storage_digests: List[str]) -> List[str]:
+        rows = self.rows.tolist()
+        blend_rows = self.blend_rows.tolist() if self.is_blended else None
+        weights = self.blend_weights.tolist() if self.is_blended else None
+        gains = self.gains.tolist() if self.gains is not None else None
+        output = list()
+        for i, row in enumerate(rows):
+            parts = [storage_digests[row]]
+            if weights is not None and weights[i] > 0:
+                parts += ["blend", storage_digests[blend_rows[i]], weights[i]]
+            if gains is not None and gains[i] != 1.0:
+                parts += ["gain", gains[i]]
+            output.append(parts[0] if len(parts) == 1 else digests.combined_digest(*parts))
+        return output
+
+    def materialize(self, storage: Tensor) -> Tensor:
+        output = storage.index_select(0, self.rows.to(storage.device))
+        chunk_size = configured_chunk_size(storage)
+        if self.is_blended:
+            blended = (self.blend_weights > 0).nonzero().squeeze(1)
+            for start in range(0, len(blended), chunk_size):
+                positions = blended[start:start + chunk_size]
+                device_positions = positions.to(storage.device)
+                first = output.index_select(0, device_positions)
+                second = storage.index_select(0, self.blend_rows[positions].to(storage.device))
+                weights = self.blend_weights[positions].to(device=storage.device, dtype=storage.dtype)
+                output.index_copy_(0, device_positions, first.lerp_(second, weights.view(-1, 1, 1, 1)))
+        if self.gains is not None:
+            scaled = (self.gains != 1.0).nonzero().squeeze(1)
+            for start in range(0, len(scaled), chunk_size):
+                positions = scaled[start:start + chunk_size]
+                device_positions = positions.to(storage.device)
+                frames = output.index_select(0, device_positions)
+                output.index_copy_(0, device_positions, image_ops.brightness(frames, self.gains[positions]))
+        return output
+
+
 class FrameSet:
     TYPE_NAME = "FRAME_SET"
 
-    def __init__(self, tensor: Tensor, framerate: FrameRate, indices: List[int] = None):
+    def __init__(self, tensor: Tensor, framerate: FrameRate, indices: List[int] = None,
+                 frame_map: FrameMap = None):
         assert isinstance(tensor, Tensor)
+        # frame_map (optional) describes the frames in terms of rows in tensor - frame sets created by slicing,
+        # reversing, repeating or gap filling share the tensor of the original frame set and their frames are
+        # only computed when needed as one tensor
         self._tensor = tensor
+        self._map = frame_map
+        self._digests = dict()
         self.framerate = framerate
+        frame_count = len(tensor) if frame_map is None else len(frame_map)
         if indices is None:
-            self.indices = list(range(len(self._tensor)))
+            self.indices = list(range(frame_count))
         else:
             self.indices = list(sorted(indices))
 
-        if not len(tensor) == len(indices):
+        if not frame_count == len(self.indices):
             raise Exception(
-                "Tensor length {}, indices {} - tensor shape {}".format(len(tensor), len(self.indices), tensor.shape))
+                "Tensor length {}, indices {} - tensor shape {}".format(frame_count, len(self.indices), tensor.shape))
 
     @property
     def image_dimensions(self):
@@ -38,11 +147,65 @@ class FrameSet:
         s = self._tensor[0].shape
         return s[1], s[0]
 
+    def frame_digests(self, mode: str = "sampled") -> List[str]:
+        frame_digests = self._digests.get(mode)
+        if frame_digests is None:
+            frame_digests = digests.frame_digests(self._tensor, mode)
+            if self._map is not None:
+                frame_digests = self._map.digests(frame_digests)
+            self._digests[mode] = frame_digests
+        return frame_digests
+
+    def fingerprint(self, mode: str = "sampled") -> str:
+        return digests.combined_digest(self.indices, self.framerate.base, self.framerate.divisor,
+                                       *self.frame_digests(mode))
+
+    def _frame_map(self) -> FrameMap:
+        if self._map is None:
+            return FrameMap.identity(len(self._tensor))
+        return self._map
+
+    def _unblended(self) -> Tuple[Tensor, Tensor]:
+        # storage tensor and storage row of each frame, computing blended frames if there are any
+        if self._map is None:
+            return self._tensor, torch.arange(len(self._tensor))
+        if self._map.has_recipes:
+            return self.tensor, torch.arange(len(self))
+        return self._tensor, self._map.rows
+
+    def faded(self, gains: Tensor):
+        # brightness factor per frame - frames with factor 1.0 stay shared with this frame set
+        return FrameSet(self._tensor, self.framerate, self.indices, self._frame_map().with_gains(gains))
+
+    def _view(self, positions, indices: List[int]):
+        return FrameSet(self._tensor, self.framerate, indices, self._frame_map().select(positions))
+
     def reindexed(self, first_index=0, step=1):
         indices = list()
         for i in range(len(self)):
             indices.append(first_index + i * step)
-        return FrameSet(self._tensor, self.framerate, indices)
+        return FrameSet(self._tensor, self.framerate, indices, self._map)
+
+    def sliced(self, start: int, end: int = None):
+        start, end, _ = slice(start, end).indices(len(self))
+        end = max(start, end)
+        if self._map is None:
+            return FrameSet(self._tensor[start:end], self.framerate, self.indices[start:end])
+        return self._view(slice(start, end), self.indices[start:end])
+
+    def reversed(self):
+        return self._view(torch.arange(len(self)).flip(0), self.indices)
+
+    def repeated(self, repetitions: int, step: int = 1):
+        if self.is_empty:
+            return self
+        indices = list()
+        last_frame_index = 0
+        for i in range(repetitions):
+            start_index = last_frame_index + step
+            indices.extend(start_index + index for index in self.indices)
+            last_frame_index = indices[-1]
+        return self._view(torch.arange(len(self)).repeat(repetitions), indices)
 
     @classmethod
     def from_images(cls, images: List[DVB_Image], framerate: FrameRate, indices: List[int] = None):
@@ -77,50 +240,51 @@ class FrameSet:
                 return True
         return False
 
-    def _generate_between_list(self):
-        prev_image = None
-        prev_index = None
-        images = self.images
-        work = list()
-        for i in range(len(self)):
-            img = images[i]
-            idx = self.indices[i]
-            if prev_index is not None:
-                for new_index in range(prev_index + 1, idx):
-                    work.append((new_index, prev_index, prev_image, idx, img))
-            prev_index = idx
-            prev_image = img
-        return work
-
     def generate_inbetween_blended(self):
-        new_frames = list()
-        for (idx, prev_img_idx, prev_img, next_img_idx, next_img) in self._generate_between_list():
-            w = (idx - prev_img_idx) / (next_img_idx - prev_img_idx)
-            new_frames.append(IndexedImage(prev_img.blend(next_img, 1.0 - w, w), idx))
-        return self.merge(FrameSet.from_indexed_images(new_frames, self.framerate))
+        if self.is_empty:
+            return self
+        tensor, storage_rows = self._unblended()
+        gaps = torch.tensor(self.indices).diff()
+        runs = torch.ones(len(self), dtype=torch.long)
+        runs[:-1] = gaps
+        total = int(runs.sum())
+        keyframes = torch.repeat_interleave(torch.arange(len(self)), runs, output_size=total)
+        offsets = torch.arange(total) - torch.repeat_interleave(runs.cumsum(0) - runs, runs, output_size=total)
+        weights = offsets / torch.repeat_interleave(runs, runs, output_size=total)
+        next_keyframes = (keyframes + 1).clamp(max=len(self) - 1)
+        frame_map = FrameMap(storage_rows[keyframes], storage_rows[next_keyframes], weights)
+        return FrameSet(tensor, self.framerate, list(range(self.first_index, self.last_index + 1)), frame_map)
+
+    def _with_runs(self, runs: Tensor):
+        # repeats frame n runs[n] times - gap fills only refer to the existing frames, nothing is copied
+        indices = list(range(self.first_index, self.first_index + int(runs.sum())))
+        return self._view(torch.repeat_interleave(torch.arange(len(self)), runs), indices)
 
     def generate_inbetween_previous(self):
-        new_frames = list()
-        for (idx, prev_img_idx, prev_img, next_img_idx, next_img) in self._generate_between_list():
-            new_frames.append(IndexedImage(prev_img, idx))
-        return self.merge(FrameSet.from_indexed_images(new_frames, self.framerate))
+        if self.is_empty:
+            return self
+        runs = torch.ones(len(self), dtype=torch.long)
+        runs[:-1] = torch.tensor(self.indices).diff()
+        return self._with_runs(runs)
 
     def generate_inbetween_closest(self):
-        new_frames = list()
-        for (idx, prev_img_idx, prev_img, next_img_idx, next_img) in self._generate_between_list():
-            if abs(idx - prev_img_idx) < abs(next_img_idx - idx):
-                new_frames.append(IndexedImage(prev_img, idx))
-            else:
-                new_frames.append(IndexedImage(next_img, idx))
-        return self.merge(FrameSet.from_indexed_images(new_frames, self.framerate))
+        if self.is_empty:
+            return self
+        gaps = torch.tensor(self.indices).diff()
+        runs = torch.ones(len(self), dtype=torch.long)
+        runs[:-1] = (gaps + 1) // 2
+        runs[1:] += gaps // 2
+        return self._with_runs(runs)
 
     @property
     def is_empty(self):
-        return len(self._tensor) == 0
+        return len(self.indices) == 0
 
     @property
     def tensor(self) -> Tensor:
-        return self._tensor
+        if self._map is None:
+            return self._tensor
+        return self._map.materialize(self._tensor)
 
     @property
     def indexed_length(self):
@@ -134,69 +298,84 @@ class FrameSet:
 
     @property
     def images(self):
-        return DVB_Image.images_from_tensor_data(self._tensor)
+        return DVB_Image.images_from_tensor_data(self.tensor)
 
     def merge(self, other):
-        final_indices = set(self.indices)
-        final_indices.update(other.indices)
-        index_lookup_self = dict()
-        index_lookup_other = dict()
-        final_indices = list(sorted(final_indices))
-        final_images = list()
-        for i in range(len(self)):
-            index_lookup_self[self.indices[i]] = i
-        for i in range(len(other)):
-            index_lookup_other[other.indices[i]] = i
-
-        for index in final_indices:
-            from_self = index_lookup_self.get(index, None)
-            from_other = index_lookup_other.get(index, None)
-            assert (from_self is not None) or (from_other is not None)
-            if from_self is not None:
-                final_images.append(self.images[from_self])
+        self_tensor, self_rows = self._unblended()
+        other_tensor, other_rows = other._unblended()
+        plan = dict()
+        for row, index in zip(other_rows.tolist(), other.indices):
+            plan[index] = (1, row)
+        for row, index in zip(self_rows.tolist(), self.indices):
+            plan[index] = (0, row)
+        final_indices = list(sorted(plan.keys()))
+        tensor = _gather_frames((self_tensor, other_tensor), [plan[index] for index in final_indices])
+        return FrameSet(tensor, self.framerate, final_indices)
+
+    @classmethod
+    def concatenate(cls, frame_sets: Sequence["FrameSet"], offsets: Sequence[int] = None, steps: Sequence[int] = None,
+                    overlaps: Sequence[int] = None):
+        # each frame set follows the last index so far (+ step + offset) - with overlap > 0 its first frames are
+        # instead blended into the last frames so far, as in fade_to - the output is allocated once
+        offsets = offsets or [0] * len(frame_sets)
+        steps = steps or [1] * len(frame_sets)
+        overlaps = overlaps or [0] * len(frame_sets)
+        sources = list()
+        plan = dict()
+        blends = dict()
+        for n, frame_set in enumerate(frame_sets):
+            tensor, rows = frame_set._unblended()
+            rows = rows.tolist()
+            sources.append(tensor)
+            if not plan:
+                indices = frame_set.indices
+                overlap = 0
             else:
-                final_images.append(other.images[from_other])
-        return FrameSet.from_images(final_images, self.framerate, final_indices)
+                tail = [index for index in sorted(plan.keys()) if index not in blends]
+                overlap = max(0, min(overlaps[n], len(frame_set), len(tail)))
+                for i, index in enumerate(tail[len(tail) - overlap:]):
+                    blends[index] = (n, rows[i], (i + 1) / (overlap + 1))
+                first_index = max(plan.keys()) + steps[n] + offsets[n]
+                indices = [first_index + i * steps[n] for i in range(len(frame_set) - overlap)]
+            for index, row in zip(indices, rows[overlap:]):
+                plan.setdefault(index, (n, row))
+
+        final_indices = list(sorted(plan.keys()))
+        output = _gather_frames(sources, [plan[index] for index in final_indices])
+        positions = {index: i for i, index in enumerate(final_indices)}
+        for n, source in enumerate(sources):
+            recipes = [(positions[index], row, weight) for index, (m, row, weight) in blends.items() if m == n]
+            if not recipes:
+                continue
+            targets, rows, weights = (torch.tensor(values, device=output.device) for values in zip(*recipes))
+            first = output.index_select(0, targets)
+            second = source.index_select(0, rows)
+            weights = weights.to(output.dtype).view(-1, 1, 1, 1)
+            output.index_copy_(0, targets, first.lerp_(second.to(output.dtype), weights))
+        framerate = frame_sets[0].framerate if frame_sets else None
+        return FrameSet(output, framerate, final_indices)
 
     def get_blended_frame_images(self):
         if self.is_empty:
             return list()
-        images = self.images
-        output_images = [images[0]]
-        last_index = self.indices[0]
-        for i in range(1, len(self)):
-            prev_img = output_images[-1]
-            img = images[i]
-            index = self.indices[i]
-            extra_frames = index - last_index - 1
-            delta = 1.0 / (extra_frames + 1)
-            for n in range(extra_frames):
-                extra_img = prev_img.blend(img, (n + 1) * delta, 1.0 - ((n + 1) * delta))
-                output_images.append(extra_img)
-            output_images.append(img)
-            last_index = index
-        return output_images
+        return DVB_Image.images_from_tensor_data(self.generate_inbetween_blended().tensor)
 
     def fade_to(self, frames_after, fade_length):
-        images_first = self.indexed_images
-        images_after = frames_after.indexed_images
-        if fade_length < 1:
-            FrameSet.from_indexed_images(images_first + images_after, self.framerate)
-        a = images_first[0:len(images_first) - fade_length]
-        b = images_first[len(images_first) - fade_length:]
-        c = images_after[0:fade_length]
-        d = images_after[fade_length:]
-
-
-        assert (len(a) + len(b)) == len(images_first)
-        assert len(b) == len(c)
-        assert (len(c) + len(d)) == len(images_after)
-
-        bandc = list()
-        for i in range(fade_length):
-            f = float(i + 1) / (fade_length + 1)
-            img = b[i].image.blend(c[i].image, 1.0 - f, f)
-            bandc.append(IndexedImage(img, b[i].index))
-
-        d = FrameSet.from_indexed_images(d, self.framerate).reindexed(bandc[-1].index + 1).indexed_images
-        return FrameSet.from_indexed_images(a + bandc + d, self.framerate)
+        fade_length = max(0, min(fade_length, len(self), len(frames_after)))
+        head_length = len(self) - fade_length
+        head = self.sliced(0, head_length)
+        first = self.sliced(head_length, len(self))
+        second = frames_after.sliced(0, fade_length)
+        tail = frames_after.sliced(fade_length, len(frames_after))
+
+        template = next((fs._tensor for fs in (self, frames_after) if not fs.is_empty), self._tensor)
+        output = template.new_empty((head_length + fade_length + len(tail),) + tuple(template.shape[1:]))
+        output[:head_length] = head.tensor
+        if fade_length > 0:
+            weights = torch.arange(1, fade_length + 1, device=output.device, dtype=output.dtype) / (fade_length + 1)
+            torch.lerp(first.tensor, second.tensor, weights.view(-1, 1, 1, 1),
+                       out=output[head_length:head_length + fade_length])
+        output[head_length + fade_length:] = tail.tensor
+
+        indices = self.indices + list(range(self.last_index + 1, self.last_index + 1 + len(tail)))
+        return FrameSet(output, self.framerate, indices)
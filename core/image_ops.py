@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import math
+
+import torch
+import torch.nn.functional as F
+from torch import Tensor
+
+# Tensor versions of the PIL operations used on DVB_Image. All functions accept a single [H,W,C] frame or an
+# [N,H,W,C] batch of float images in the range 0..1. Factors may be a float or a tensor with one value per frame.
+
+_LUMINANCE = (0.299, 0.587, 0.114)
+
+
+def _per_frame(value, tensor: Tensor):
+    if not isinstance(value, Tensor):
+        return value
+    value = value.to(device=tensor.device, dtype=tensor.dtype)
+    if tensor.dim() == 4 and value.numel() == len(tensor):
+        return value.view(-1, 1, 1, 1)
+    return value.reshape(())
+
+
+def _split_alpha(tensor: Tensor):
+    if tensor.shape[-1] == 4:
+        return tensor[..., :3], tensor[..., 3:]
+    return tensor, None
+
+
+def _join_alpha(color: Tensor, alpha: Tensor):
+    if alpha is None:
+        return color
+    return torch.cat((color, alpha), dim=-1)
+
+
+def brightness(tensor: Tensor, factor) -> Tensor:
+    color, alpha = _split_alpha(tensor)
+    return _join_alpha((color * _per_frame(factor, tensor)).clamp(0.0, 1.0), alpha)
+
+
+def luminance(tensor: Tensor) -> Tensor:
+    color, _ = _split_alpha(tensor)
+    if color.shape[-1] < 3:
+        return color.mean(dim=-1)
+    weights = torch.tensor(_LUMINANCE, device=color.device, dtype=color.dtype)
+    return color @ weights
+
+
+def contrast(tensor: Tensor, factor) -> Tensor:
+    color, alpha = _split_alpha(tensor)
+    if tensor.dim() == 4:
+        mean = luminance(color).mean(dim=(1, 2)).view(-1, 1, 1, 1)
+    else:
+        mean = luminance(color).mean()
+    return _join_alpha((mean + (color - mean) * _per_frame(factor, tensor)).clamp(0.0, 1.0), alpha)
+
+
+def blend(a: Tensor, b: Tensor, alpha) -> Tensor:
+    return torch.lerp(a, b.to(a.dtype), _per_frame(alpha, a))
+
+
+def _gaussian_kernel(sigma: float, device, dtype) -> Tensor:
+    radius = max(1, math.ceil(3.0 * sigma))
+    x = torch.arange(-radius, radius + 1, device=device, dtype=dtype)
+    kernel = torch.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+
+def gaussian_blur(tensor: Tensor, radius: float) -> Tensor:
+    if radius <= 0:
+        return tensor
+    batch = tensor if tensor.dim() == 4 else tensor.unsqueeze(0)
+    channels = batch.shape[-1]
+    kernel = _gaussian_kernel(radius, batch.device, batch.dtype)
+    k = len(kernel) // 2
+    x = batch.permute(0, 3, 1, 2)
+    x = F.pad(x, (k, k, k, k), mode="replicate")
+    x = F.conv2d(x, kernel.view(1, 1, 1, -1).expand(channels, 1, 1, -1), groups=channels)
+    x = F.conv2d(x, kernel.view(1, 1, -1, 1).expand(channels, 1, -1, 1), groups=channels)
+    x = x.permute(0, 2, 3, 1)
+    return x if tensor.dim() == 4 else x.squeeze(0)
+
+
+def color_matrix(tensor: Tensor, matrix) -> Tensor:
+    color, _ = _split_alpha(tensor)
+    if color.shape[-1] == 1:
+        color = color.expand(color.shape[:-1] + (3,))
+    matrix = torch.as_tensor(matrix, device=color.device, dtype=color.dtype).view(3, 3)
+    return (color @ matrix.T).clamp(0.0, 1.0)
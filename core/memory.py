@@ -1,7 +1,89 @@
+import os
+import time
+
 import comfy.model_management
 import torch
 
-def gc_comfyui():
-    comfy.model_management.cleanup_models()
-    torch.cuda.empty_cache()
-    torch.cuda.ipc_collect()
\ No newline at end of file
+from .config import DVB_Config
+
+_MB = 1024 * 1024
+
+
+def resident_memory_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / _MB
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / _MB
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class MemoryPolicy:
+    MODES = ("always", "never", "threshold", "every_n")
+
+    def __init__(self, mode: str = "always", threshold_mb: float = 0.0, every_n: int = 1):
+        if mode not in MemoryPolicy.MODES:
+            raise Exception("Unknown memory policy mode: {}".format(mode))
+        self.mode = mode
+        self.threshold_mb = threshold_mb
+        self.every_n = max(1, every_n)
+        self.requests = 0
+        self.collections = 0
+        self.seconds = 0.0
+
+    @classmethod
+    def from_config(cls, config: DVB_Config):
+        return MemoryPolicy(config.get("memory.gc_mode", "always"), config.get("memory.gc_threshold_mb", 0),
+                            config.get("memory.gc_every_n", 1))
+
+    def should_collect(self) -> bool:
+        if self.mode == "always":
+            return True
+        elif self.mode == "never":
+            return False
+        elif self.mode == "every_n":
+            return (self.requests - 1) % self.every_n == 0
+        else:
+            rss = resident_memory_mb()
+            return rss is None or rss >= self.threshold_mb
+
+    def collect(self, force: bool = False) -> bool:
+        self.requests += 1
+        if not (force or self.should_collect()):
+            return False
+        t = time.perf_counter()
+        comfy.model_management.cleanup_models()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+            torch.cuda.ipc_collect()
+        self.seconds += time.perf_counter() - t
+        self.collections += 1
+        return True
+
+    def statistics(self):
+        return {
+            "mode": self.mode,
+            "requests": self.requests,
+            "collections": self.collections,
+            "seconds": self.seconds
+        }
+
+
+_policy = None
+
+
+def memory_policy() -> MemoryPolicy:
+    global _policy
+    if _policy is None:
+        _policy = MemoryPolicy.from_config(DVB_Config())
+    return _policy
+
+
+def gc_comfyui(force: bool = False):
+    policy = memory_policy()
+    if policy.collect(force) and DVB_Config().get("debug", False):
+        print("DVB memory cleanup: {}".format(policy.statistics()))
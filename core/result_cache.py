@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import functools
+import hashlib
+import inspect
+import os
+
+import torch
+
+from .config import DVB_Config
+from .framerate import FrameRate
+from .frameset import FrameSet
+from .statestore import TEMP_PATH
+from .utility import hashed_as_strings
+
+_MB = 1024 * 1024
+
+# bump when the format of cached entries changes - changes to the node code are picked up by _code_version
+_CACHE_FORMAT = 1
+
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@functools.lru_cache(maxsize=None)
+def _code_version() -> str:
+    # digest of the package sources, so results cached by other versions of the nodes are never returned
+    m = hashlib.blake2b(digest_size=16)
+    for directory in (_PACKAGE_ROOT, os.path.dirname(os.path.abspath(__file__))):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".py"):
+                with open(os.path.join(directory, name), "rb") as f:
+                    m.update(name.encode(encoding="utf-8"))
+                    m.update(f.read())
+    return m.hexdigest()
+
+
+def _as_token(value, mode: str) -> str:
+    if isinstance(value, FrameSet):
+        return "FrameSet:" + value.fingerprint(mode)
+    return repr(value)
+
+
+def _pack(value):
+    if isinstance(value, FrameSet):
+        return {"frames": value.tensor.cpu(), "indices": value.indices,
+                "framerate": [value.framerate.base, value.framerate.divisor]}
+    return {"value": value}
+
+
+def _unpack(packed):
+    if "frames" in packed:
+        return FrameSet(packed["frames"], FrameRate(*packed["framerate"]), packed["indices"])
+    return packed["value"]
+
+
+class ResultCache:
+    SUFFIX = ".dvbcache"
+
+    def __init__(self, directory: str, max_size_mb: float):
+        self._directory = directory
+        self._max_size = int(max_size_mb * _MB)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key + ResultCache.SUFFIX)
+
+    def get(self, key: str):
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            packed = torch.load(path, weights_only=True)
+        except Exception as e:
+            print("Failed to read cached result {}: {}".format(path, e))
+            return None
+        os.utime(path)
+        return tuple(map(_unpack, packed))
+
+    def put(self, key: str, result: tuple):
+        os.makedirs(self._directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        torch.save([_pack(value) for value in result], tmp_path)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = list()
+        with os.scandir(self._directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(ResultCache.SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(map(lambda item: item[1], entries))
+        for _, size, path in sorted(entries):
+            if total <= self._max_size:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def result_cache():
+    config = DVB_Config()
+    if not config.get("cache.enabled", False):
+        return None
+    directory = config.get("cache.directory", "") or os.path.join(TEMP_PATH, "cache")
+    return ResultCache(directory, config.get("cache.max_size_mb", 10240))
+
+
+def cached_result(fun):
+    # caches the node results on disk, keyed by node, parameters and the content of input frame sets
+    signature = inspect.signature(fun)
+    self_name = next(iter(signature.parameters))
+    var_keyword = next((p.name for p in signature.parameters.values() if p.kind == p.VAR_KEYWORD), None)
+
+    @functools.wraps(fun)
+    def _cached(self, *args, **kwargs):
+        cache = result_cache()
+        if cache is None:
+            return fun(self, *args, **kwargs)
+        mode = DVB_Config().get("cache.fingerprint_mode", "sampled")
+        # bound by name with defaults applied, so positional, keyword and omitted defaulted arguments share a key
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        arguments.pop(self_name)
+        if var_keyword is not None:
+            arguments.update(arguments.pop(var_keyword))
+        key = hashed_as_strings(_CACHE_FORMAT, _code_version(),
+                                type(self).__dict__.get("NODE_NAME", type(self).__name__), fun.__name__,
+                                **{name: _as_token(value, mode) for name, value in sorted(arguments.items())})
+        result = cache.get(key)
+        if result is None:
+            result = fun(self, *args, **kwargs)
+            cache.put(key, result)
+        return result
+
+    return _cached
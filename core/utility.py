@@ -1,6 +1,18 @@
+import contextlib
 import hashlib
+import heapq
 import json
 import os
+import socket
+import time
+
+from .config import DVB_Config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
 
 
 def hashed_as_strings(*items, **kwargs):
@@ -13,35 +25,281 @@ def hashed_as_strings(*items, **kwargs):
 
 
 
+_JOURNAL_SUFFIX = ".journal"
+_LOCK_SUFFIX = ".lock"
+_COMPACT_MIN_RECORDS = 1000
+
+FAILED = "failed"
+
+
+def worker_id() -> str:
+    return "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.lockf(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _relative_name(directory, filename):
+    # files are stored relative to the state file with "/" separators, so workers that mount a shared directory at
+    # different paths (or on different systems) agree on the names - absolute names of older states are converted
+    if os.path.isabs(filename):
+        try:
+            filename = os.path.relpath(filename, directory)
+        except ValueError:
+            return filename
+    return filename.replace(os.sep, "/")
+
+
+class _ForEachData:
+    # snapshot (json, file -> False/True/"failed") + append-only journal of ["add", files...], ["claim", file,
+    # worker, expires, attempt], ["done", file] and ["failed", file] records, replayed on load
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.directory = os.path.dirname(filepath)
+        self.journal_path = filepath + _JOURNAL_SUFFIX
+        self._load()
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.filepath)
+            return stat.st_mtime_ns, stat.st_size, stat.st_ino
+        except OSError:
+            return None
+
+    def _load(self):
+        self.snapshot = self._signature()
+        try:
+            with open(self.filepath, "r", encoding="utf8") as f:
+                self.status = {self._name(name): status for name, status in json.load(f).items()}
+        except (OSError, ValueError):
+            self.status = dict()
+        # pending files in sorted order - finished files are dropped lazily when they reach the front
+        self.pending = [name for name, status in self.status.items() if status is False]
+        heapq.heapify(self.pending)
+        self.claims = dict()
+        self.last_claims = dict()
+        self.journal_offset = 0
+        self.journal_records = 0
+        self._replay()
+
+    def _name(self, filename):
+        return _relative_name(self.directory, filename)
+
+    def _apply(self, record):
+        if record[0] == "add":
+            for name in map(self._name, record[1:]):
+                if name not in self.status:
+                    self.status[name] = False
+                    heapq.heappush(self.pending, name)
+        elif record[0] == "claim":
+            name = self._name(record[1])
+            self.claims[name] = (record[2], record[3], record[4] if len(record) > 4 else 1)
+            self.last_claims[record[2]] = name
+        elif record[0] == "done":
+            self.status[self._name(record[1])] = True
+            self.claims.pop(self._name(record[1]), None)
+        elif record[0] == "failed":
+            self.status[self._name(record[1])] = FAILED
+            self.claims.pop(self._name(record[1]), None)
+
+    def _replay(self):
+        try:
+            f = open(self.journal_path, "rb")
+        except OSError:
+            return
+        with f:
+            f.seek(self.journal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.journal_offset += len(line)
+                self.journal_records += 1
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, IndexError):
+                    pass
+
+    def refresh(self):
+        if self._signature() != self.snapshot:
+            self._load()
+            return
+        try:
+            size = os.path.getsize(self.journal_path)
+        except OSError:
+            size = 0
+        if size < self.journal_offset:
+            self._load()
+        elif size > self.journal_offset:
+            self._replay()
+
+    def append(self, record):
+        line = (json.dumps(record) + "\n").encode(encoding="utf-8")
+        with open(self.journal_path, "ab") as f:
+            if f.tell() > self.journal_offset:
+                # terminate a record torn by an interrupted write
+                f.write(b"\n")
+            f.write(line)
+            self.journal_offset = f.tell()
+        self.journal_records += 1
+        self._apply(record)
+        if self.journal_records > max(_COMPACT_MIN_RECORDS, len(self.status)):
+            self.compact()
+
+    def compact(self):
+        tmp_path = self.filepath + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump(self.status, f, indent=2)
+        # claims of unfinished files are kept, expired ones too, as they count the attempts on each file
+        claims = [["claim", name, worker, expires, attempt] for name, (worker, expires, attempt)
+                  in self.claims.items() if self.status.get(name) is False]
+        os.replace(tmp_path, self.filepath)
+        with open(self.journal_path, "wb") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in claims).encode(encoding="utf-8"))
+            self.journal_offset = f.tell()
+        self.snapshot = self._signature()
+        self.journal_records = len(claims)
+        self.claims = {record[1]: (record[2], record[3], record[4]) for record in claims}
+        self.last_claims = {worker: name for name, (worker, _, _) in self.claims.items()}
+
+    def is_complete(self):
+        return all(status is not False for status in self.status.values())
+
+    def claimed_by(self, worker: str):
+        name = self.last_claims.get(worker)
+        if name is not None and self.status.get(name) is False:
+            return name
+        return None
+
+    def claim(self, worker: str, lease_seconds: float, max_attempts: int):
+        now = time.time()
+        own = self.claimed_by(worker)
+        if own is not None and self.claims[own][0] == worker:
+            self.append(["claim", own, worker, now + lease_seconds, self.claims[own][2]])
+            return own
+        claimed_by_others = list()
+        found = None
+        while self.pending:
+            name = self.pending[0]
+            claim = self.claims.get(name)
+            if self.status.get(name) is not False:
+                heapq.heappop(self.pending)
+            elif claim is not None and claim[1] > now:
+                claimed_by_others.append(heapq.heappop(self.pending))
+            elif claim is not None and claim[2] >= max_attempts:
+                # leased max_attempts times without being finished - most likely it crashes the workflow
+                heapq.heappop(self.pending)
+                self.append(["failed", name])
+            else:
+                found = name
+                break
+        for name in claimed_by_others:
+            heapq.heappush(self.pending, name)
+        if found is not None:
+            attempt = 1 if claim is None else claim[2] + 1
+            self.append(["claim", found, worker, now + lease_seconds, attempt])
+        return found
+
+
+_foreach_data = dict()
+
+
 class ForEachState:
+    # files are handed out as leases to one worker (host and process) at a time - a lease that is not finished
+    # with mark_done or mark_failed before it expires is handed out again, so crashed workers do not lose files.
+    # A file whose lease expired foreach.max_attempts times is marked failed instead.
     def __init__(self, filepath):
         self._filepath = os.path.abspath(filepath)
         self._dir = os.path.normpath(os.path.dirname(self._filepath))
-        try:
-            with open(self._filepath, "r", encoding="utf8") as f:
-                self._data = json.load(f)
-        except:
-            self._data = dict()
+        self._lock_path = self._filepath + _LOCK_SUFFIX
+        with _file_lock(self._lock_path):
+            self._data = _foreach_data.get(self._filepath)
+            if self._data is None:
+                self._data = _ForEachData(self._filepath)
+                _foreach_data[self._filepath] = self._data
+            else:
+                self._data.refresh()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with _file_lock(self._lock_path):
+            self._data.refresh()
+            yield self._data
+
+    def _name(self, filename):
+        return _relative_name(self._dir, os.path.abspath(filename))
 
     def add_files_to_process(self, files):
-        all_files = set(self._data.keys())
-        all_files.update(files)
-        for filename in all_files:
-            if filename not in self._data:
-                self._data[filename] = False
-        with open(self._filepath, "w", encoding="utf8") as f:
-            txt = json.dumps(self._data, indent=2)
-            f.write(txt)
+        names = list(dict.fromkeys(map(self._name, files)))
+        with self._locked() as data:
+            new_files = [name for name in names if name not in data.status]
+            if new_files:
+                data.append(["add"] + new_files)
+
+    def _finish(self, filename, kind):
+        if filename is None:
+            return
+        with self._locked() as data:
+            data.append([kind, self._name(filename)])
 
     def mark_done(self, filename):
-        self._data[filename] = True
-        with open(self._filepath, "w", encoding="utf8") as f:
-            txt = json.dumps(self._data, indent=2)
-            f.write(txt)
+        self._finish(filename, "done")
+
+    def mark_failed(self, filename):
+        self._finish(filename, "failed")
 
     def pop(self):
-        for filename in sorted(self._data.keys()):
-            if not self._data.get(filename, False):
-                print("pop {}".format(filename))
-                return os.path.join(self._dir, filename)
-        return None
+        with self._locked() as data:
+            config = DVB_Config()
+            filename = data.claim(worker_id(), config.get("foreach.lease_seconds", 3600),
+                                  config.get("foreach.max_attempts", 3))
+        if filename is None:
+            return None
+        print("pop {}".format(filename))
+        return os.path.normpath(os.path.join(self._dir, filename))
+
+    def claimed_by(self, worker: str = None):
+        # the file last claimed by the worker, if it is not finished - also when the lease has expired
+        with self._locked() as data:
+            filename = data.claimed_by(worker or worker_id())
+        if filename is None:
+            return None
+        return os.path.normpath(os.path.join(self._dir, filename))
+
+    def claim_owner(self, filename):
+        with self._locked() as data:
+            claim = data.claims.get(self._name(filename))
+        if claim is None:
+            return None
+        return claim[0]
+
+    def remove_if_complete(self):
+        # checked and removed under one lock, so files added or claimed by other workers meanwhile are not lost -
+        # the lock file stays, as other workers may hold or wait for a lock on it
+        with self._locked() as data:
+            if not data.is_complete():
+                return False
+            _foreach_data.pop(self._filepath, None)
+            for path in (self._filepath, data.journal_path):
+                if os.path.isfile(path):
+                    os.unlink(path)
+            return True
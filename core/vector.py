@@ -4,8 +4,12 @@ from __future__ import division
 import math
 from functools import cache
 
+import numpy
+
 
 class Vector2d:
+    __slots__ = ("x", "y")
+
     def __init__(self, x, y=0.0):
         if isinstance(x, tuple):
             self.x = x[0]
@@ -84,14 +88,19 @@ def _intersect_lines(pt1, pt2, ptA, ptB):
 
 
 class Quad2d:
+    __slots__ = ("mincorner", "maxcorner")
+
     def __init__(self, x1, y1, x2, y2):
         self.mincorner = Vector2d(min(x1, x2), min(y1, y2))
         self.maxcorner = Vector2d(max(x1, x2), max(y1, y2))
-        self._default_forgiveness = self.maxcorner.sub(self.mincorner).length() * 0.00001
 
     @property
     def diagonal_length(self):
-        return self.maxcorner.sub(self.mincorner).length()
+        return math.hypot(self.maxcorner.x - self.mincorner.x, self.maxcorner.y - self.mincorner.y)
+
+    @property
+    def _default_forgiveness(self):
+        return self.diagonal_length * 0.00001
 
     def add(self, v: Vector2d):
         a = self.mincorner.add(v)
@@ -141,3 +150,142 @@ class Quad2d:
 
     def __str__(self):
         return "({} - {})".format(self.mincorner, self.maxcorner)
+
+
+def _as_points(v):
+    if isinstance(v, Vector2dArray):
+        return v.points
+    if isinstance(v, Vector2d):
+        return numpy.array(v.tuple(), dtype=numpy.float64)
+    return numpy.asarray(v, dtype=numpy.float64)
+
+
+def _as_factors(v):
+    if isinstance(v, (int, float)):
+        return v
+    return numpy.asarray(v, dtype=numpy.float64).reshape(-1, 1)
+
+
+class Vector2dArray:
+    __slots__ = ("points",)
+
+    def __init__(self, points):
+        self.points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+
+    @classmethod
+    def from_xy(cls, x, y):
+        x, y = numpy.broadcast_arrays(numpy.asarray(x, dtype=numpy.float64), numpy.asarray(y, dtype=numpy.float64))
+        return Vector2dArray(numpy.stack((x.ravel(), y.ravel()), axis=-1))
+
+    @classmethod
+    def repeat(cls, v: Vector2d, n: int):
+        return Vector2dArray(numpy.tile(numpy.array(v.tuple(), dtype=numpy.float64), (n, 1)))
+
+    @property
+    def x(self):
+        return self.points[:, 0]
+
+    @property
+    def y(self):
+        return self.points[:, 1]
+
+    def __len__(self):
+        return len(self.points)
+
+    def __getitem__(self, item):
+        return Vector2d(float(self.points[item, 0]), float(self.points[item, 1]))
+
+    def normalized(self):
+        return self.multiply(1.0 / self.length())
+
+    def neg(self):
+        return Vector2dArray(-self.points)
+
+    def multiply(self, v):
+        return Vector2dArray(self.points * _as_factors(v))
+
+    def length(self):
+        return numpy.hypot(self.points[:, 0], self.points[:, 1])
+
+    def add(self, vectors):
+        return Vector2dArray(self.points + _as_points(vectors))
+
+    def sub(self, vectors):
+        return Vector2dArray(self.points - _as_points(vectors))
+
+    def __str__(self):
+        return "[" + ", ".join(map(str, (self[i] for i in range(len(self))))) + "]"
+
+
+class Quad2dArray:
+    __slots__ = ("mincorner", "maxcorner")
+
+    def __init__(self, x1, y1, x2, y2):
+        x1, y1, x2, y2 = numpy.broadcast_arrays(*[numpy.asarray(v, dtype=numpy.float64) for v in (x1, y1, x2, y2)])
+        self.mincorner = Vector2dArray.from_xy(numpy.minimum(x1, x2), numpy.minimum(y1, y2))
+        self.maxcorner = Vector2dArray.from_xy(numpy.maximum(x1, x2), numpy.maximum(y1, y2))
+
+    @classmethod
+    def repeat(cls, quad: Quad2d, n: int):
+        return Quad2dArray(numpy.full(n, quad.mincorner.x), numpy.full(n, quad.mincorner.y),
+                           numpy.full(n, quad.maxcorner.x), numpy.full(n, quad.maxcorner.y))
+
+    def __len__(self):
+        return len(self.mincorner)
+
+    def __getitem__(self, item):
+        a = self.mincorner[item]
+        b = self.maxcorner[item]
+        return Quad2d(a.x, a.y, b.x, b.y)
+
+    @property
+    def diagonal_length(self):
+        return self.maxcorner.sub(self.mincorner).length()
+
+    @property
+    def center(self):
+        return self.maxcorner.add(self.mincorner).multiply(0.5)
+
+    def add(self, vectors):
+        a = self.mincorner.add(vectors)
+        b = self.maxcorner.add(vectors)
+        return Quad2dArray(a.x, a.y, b.x, b.y)
+
+    def contains_vectors(self, vectors, forgiveness=None):
+        if forgiveness is None:
+            forgiveness = self.diagonal_length * 0.00001
+        forgiveness = numpy.asarray(forgiveness, dtype=numpy.float64).reshape(-1, 1)
+        points = _as_points(vectors)
+        return numpy.all((self.mincorner.points - forgiveness <= points) &
+                         (points <= self.maxcorner.points + forgiveness), axis=-1)
+
+    def calculate_intersections(self, pos, direction):
+        # same edge order and selection as Quad2d.calculate_intersections, for all quads at once
+        pos = _as_points(pos) * numpy.ones((len(self), 1))
+        direction = _as_points(direction) * numpy.ones((len(self), 1))
+        lo = self.mincorner.points
+        hi = self.maxcorner.points
+        forgiveness = self.diagonal_length * 0.00001
+        candidates = list()
+        valid = list()
+        for axis, bound in ((0, lo), (1, hi), (0, hi), (1, lo)):
+            other = 1 - axis
+            d = direction[:, axis]
+            parallel = numpy.abs(d) < 0.00000001
+            t = (bound[:, axis] - pos[:, axis]) / numpy.where(parallel, 1.0, d)
+            point = numpy.empty_like(pos)
+            point[:, axis] = bound[:, axis]
+            point[:, other] = pos[:, other] + t * direction[:, other]
+            candidates.append(point)
+            valid.append(~parallel & self.contains_vectors(point, forgiveness))
+        candidates = numpy.stack(candidates, axis=1)
+        valid = numpy.stack(valid, axis=1)
+        rows = numpy.arange(len(self))
+        first = candidates[rows, numpy.argmax(valid, axis=1)]
+        distinct = valid & (numpy.hypot(*(candidates - first[:, None, :]).transpose(2, 0, 1)) >
+                            forgiveness[:, None])
+        second = candidates[rows, numpy.argmax(distinct, axis=1)]
+        return Vector2dArray(first), Vector2dArray(second)
+
+    def __str__(self):
+        return "[" + ", ".join(map(str, (self[i] for i in range(len(self))))) + "]"
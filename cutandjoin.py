@@ -1,6 +1,4 @@
 # -*- coding: utf-8 -*-
-from .core.frameset import IndexedImage
-
 from .categories import *
 from .core import *
 
@@ -81,6 +79,45 @@ class DVB_ConcatFrameSets:
         return (a.merge(b.reindexed(first_index, step)),)
 
 
+class DVB_ConcatMultipleFrameSets:
+    NODE_NAME = "Frame Set Concatenate"
+    ICON = "🔗"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "frames_1": (FrameSet.TYPE_NAME,),
+                "offset_from_end": ("INT", {"default": 0}),
+                "step": ("INT", {"default": 1, "min": 1}),
+                "transition_seconds": ("FLOAT", {"default": 0.0, "min": 0.0, "step": 0.1}),
+            },
+            "optional": {
+                "frames_" + str(n): (FrameSet.TYPE_NAME,) for n in range(2, 9)
+            }
+        }
+
+    CATEGORY = NodeCategories.EDIT
+    RETURN_TYPES = (FrameSet.TYPE_NAME,)
+    RETURN_NAMES = ("frames",)
+    FUNCTION = "result"
+
+    def result(self, frames_1: FrameSet, offset_from_end, step, transition_seconds, **others):
+        frame_sets = [frames_1]
+        for n in range(2, 9):
+            frames = others.get("frames_" + str(n), None)
+            if frames is None:
+                continue
+            if frames.framerate != frames_1.framerate:
+                on_node_error(DVB_ConcatMultipleFrameSets,
+                              "Frame sets have different framerate {} and {} - cannot concatenate!".format(
+                                  frames_1.framerate, frames.framerate))
+            frame_sets.append(frames)
+        overlap = frames_1.framerate.seconds_to_frames(transition_seconds)
+        return (FrameSet.concatenate(frame_sets, [0] + [offset_from_end] * (len(frame_sets) - 1),
+                                     [step] * len(frame_sets), [0] + [overlap] * (len(frame_sets) - 1)),)
+
+
 class DVB_MergeFrames:
     NODE_NAME = "Frame Set Merger"
     ICON = "🗍"
@@ -131,22 +168,11 @@ class DVB_Splitter:
     FUNCTION = "result"
 
     def result(self, frames: FrameSet, overlap: int):
-        images = frames.indexed_images
-        n = len(images) // 2
-        first_half = images[0:n]
-        second_half = images[n:]
-        first_half_overlap = min(len(second_half), overlap // 2)
-        second_half_overlap = min(len(first_half), overlap - first_half_overlap)
-        first_half_extra = list()
-        second_half_extra = list()
-        for i in range(first_half_overlap):
-            first_half_extra.append(second_half[i])
-        for i in range(second_half_overlap):
-            second_half_extra.insert(0, first_half[-(n + 1)])
-        first_half = first_half + first_half_extra
-        second_half = second_half_extra + second_half
-        return (FrameSet.from_indexed_images(first_half, frames.framerate),
-                FrameSet.from_indexed_images(second_half, frames.framerate))
+        n = len(frames) // 2
+        first_half_overlap = min(len(frames) - n, overlap // 2)
+        second_half_overlap = min(n, overlap - first_half_overlap)
+        return (frames.sliced(0, n + first_half_overlap),
+                frames.sliced(n - second_half_overlap, len(frames)))
 
 
 class DVB_Reverse:
@@ -167,7 +193,7 @@ class DVB_Reverse:
     FUNCTION = "result"
 
     def result(self, frames: FrameSet):
-        return (FrameSet.from_images(list(reversed(frames.images)), frames.framerate, frames.indices),)
+        return (frames.reversed(),)
 
 class DVB_FrameSetRepeat:
     NODE_NAME = "Frame Set Repeat"
@@ -189,16 +215,7 @@ class DVB_FrameSetRepeat:
     FUNCTION = "result"
 
     def result(self, frames: FrameSet, repetitions, step):
-        original_frames = frames.indexed_images
-        result = list()
-        last_frame_index = 0
-        for i in range(repetitions):
-            start_index = last_frame_index + step
-            for f in original_frames:
-                result.append(IndexedImage(f.image, start_index + f.index))
-            last_frame_index = result[-1].index
-
-        return (FrameSet.from_indexed_images(result, frames.framerate),)
+        return (frames.repeated(repetitions, step),)
 
 class DVB_FrameSetSplitBeginning:
     NODE_NAME = "Frame Set Split Beginning"
@@ -220,11 +237,7 @@ class DVB_FrameSetSplitBeginning:
 
     def result(self, frames: FrameSet, num_entries):
         num_entries = min(len(frames), num_entries)
-        images = frames.indexed_images
-        a = images[0:num_entries]
-        b = images[num_entries:]
-
-        return FrameSet.from_indexed_images(a, frames.framerate), FrameSet.from_indexed_images(b, frames.framerate)
+        return frames.sliced(0, num_entries), frames.sliced(num_entries, len(frames))
 
 
 class DVB_FrameSetSplitEnd:
@@ -248,8 +261,4 @@ class DVB_FrameSetSplitEnd:
     def result(self, frames: FrameSet, num_entries):
         num_entries = min(len(frames), num_entries)
         n = len(frames) - num_entries
-        images = frames.indexed_images
-        a = images[0:n]
-        b = images[n:]
-
-        return FrameSet.from_indexed_images(a, frames.framerate), FrameSet.from_indexed_images(b, frames.framerate)
\ No newline at end of file
+        return frames.sliced(0, n), frames.sliced(n, len(frames))
\ No newline at end of file
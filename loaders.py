@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 import os
-import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from PIL import Image
 
 from .categories import NodeCategories
 from .core import *
+from .shared import list_images_in_directory
 
 
 class DVB_LoadImageFromPath:
@@ -19,6 +23,10 @@ class DVB_LoadImageFromPath:
         return {
             "required": {
                 "image_path": ("STRING", {"default": '', "multiline": False}),
+            },
+            "optional": {
+                "width": ("INT", {"default": 0, "min": 0}),
+                "height": ("INT", {"default": 0, "min": 0}),
             }
         }
 
@@ -27,11 +35,85 @@ class DVB_LoadImageFromPath:
         image_path = kwargs.get("image_path", "None")
         if (not image_path) or (not os.path.isfile(image_path)):
             return ""
-        m = hashlib.sha256()
-        with open(image_path, "rb") as f:
-            m.update(f.read())
-        return m.digest().hex()
+        return file_fingerprint(image_path)
+
+    def result(self, image_path, width=0, height=0, **other):
+        image = DVB_Image(file_path=image_path, with_alpha=True, size=(width, height))
+        return (DVB_Image.join_to_tensor_data([image]),)
+
+
+
+def _load_frame(file_path: str, width: int, height: int):
+    return DVB_Image(file_path=file_path, size=(width, height)).convert("RGB").tensor_image
+
+
+class DVB_LoadFrameSetFromDirectory:
+    NODE_NAME = "Load Frame Set From Directory"
+    CATEGORY = NodeCategories.IO
+    RETURN_TYPES = (FrameSet.TYPE_NAME,)
+    RETURN_NAMES = ("frames",)
+    FUNCTION = "result"
+    ICON = "🗂"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "directory": ("STRING", {"default": '', "multiline": False}),
+                "pattern": ("STRING", {"default": "*"}),
+                "indexing": (["numeric", "alphabetic"],),
+                "first_index": ("INT", {"default": 0, "min": -1}),
+                "last_index": ("INT", {"default": -1, "min": -1}),
+                "stride": ("INT", {"default": 1, "min": 1}),
+                "width": ("INT", {"default": 0, "min": 0}),
+                "height": ("INT", {"default": 0, "min": 0}),
+                "framerate_base": ("INT", {"default": 24, "min": 1}),
+                "framerate_divisor": ("INT", {"default": 1, "min": 1}),
+            }
+        }
+
+    @classmethod
+    def _select_files(cls, directory, pattern, indexing, first_index, last_index, stride):
+        files = list_images_in_directory(directory.strip('"'), pattern, indexing == "alphabetic")
+        batches = dict()
+        for index, paths in files.items():
+            for path in paths:
+                batch = batches.setdefault(os.path.dirname(path), dict())
+                if index in batch:
+                    on_node_error(cls, "Files {} and {} have the same index {}".format(batch[index], path, index))
+                batch[index] = path
+        # batch_NNNN folders follow each other - a batch whose numbering restarts is offset to continue the sequence
+        sequence = list()
+        for batch_path in sorted(batches.keys()):
+            batch = batches[batch_path]
+            offset = 0
+            if sequence and min(batch) <= sequence[-1][0]:
+                offset = sequence[-1][0] + 1 - min(batch)
+            sequence.extend((index + offset, batch[index]) for index in sorted(batch))
+        selected = [item for item in sequence if item[0] >= first_index and (last_index < 0 or item[0] <= last_index)]
+        return selected[::stride]
+
+    @classmethod
+    def IS_CHANGED(cls, directory, pattern, indexing, first_index, last_index, stride, **other):
+        selected = cls._select_files(directory, pattern, indexing, first_index, last_index, stride)
+        return hashed_as_strings(*[(i, path, os.stat(path).st_mtime_ns) for i, path in selected])
+
+    def result(self, directory, pattern, indexing, first_index, last_index, stride, width, height,
+               framerate_base, framerate_divisor, **other):
+        selected = self._select_files(directory, pattern, indexing, first_index, last_index, stride)
+        if not selected:
+            on_node_error(DVB_LoadFrameSetFromDirectory, "No images found in {}".format(directory))
+        with Image.open(selected[0][1]) as first:
+            width, height = DVB_Image.target_size(first.width, first.height, width, height)
+        tensor = torch.empty((len(selected), height, width, 3), dtype=torch.float32)
 
-    def result(self, image_path, **other):
-        return (DVB_Image.join_to_tensor_data([DVB_Image(file_path=image_path, with_alpha=True)]),)
+        def _load(n: int):
+            tensor[n] = _load_frame(selected[n][1], width, height)
 
+        workers = DVB_Config().get("io.load_workers", 0)
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=min(workers, len(selected))) as executor:
+            list(executor.map(_load, range(len(selected))))
+        indices = list(map(lambda item: item[0], selected))
+        return (FrameSet(tensor, FrameRate(framerate_base, framerate_divisor), indices),)
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import fnmatch
 import os
 import random
+import time
 from typing import Dict, Tuple, List
 import glob
 
@@ -20,19 +22,58 @@ def pick_random_by_weight(data: List[Tuple[float, object]], rng: random.Random):
     return data[0][1]
 
 
+# directory path -> (mtime_ns, entry names, subdirectory names) - a directory is only scanned again when its mtime
+# changes, so a listing of an unchanged tree costs one stat per directory
+_directory_index = dict()
+
+# directories modified this recently are not cached, as further changes may not move the mtime (coarse timestamps)
+_RACY_INTERVAL_NS = 2 * 1000 * 1000 * 1000
+
+
+def _scan_directory(directory_path: str):
+    mtime = os.stat(directory_path).st_mtime_ns
+    cached = _directory_index.get(directory_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2]
+    names = list()
+    subdirectories = set()
+    with os.scandir(directory_path) as it:
+        for entry in it:
+            names.append(entry.name)
+            if entry.is_dir():
+                subdirectories.add(entry.name)
+    names.sort()
+    if time.time_ns() - mtime > _RACY_INTERVAL_NS:
+        _directory_index[directory_path] = (mtime, names, subdirectories)
+    else:
+        _directory_index.pop(directory_path, None)
+    return names, subdirectories
+
+
+def _match_in_directory(directory_path: str, pattern: str, names) -> List[str]:
+    if os.sep in pattern or (os.altsep and os.altsep in pattern):
+        return glob.glob(os.path.join(directory_path, pattern), recursive=False)
+    if not pattern.startswith("."):
+        names = filter(lambda name: not name.startswith("."), names)
+    return [os.path.join(directory_path, name) for name in fnmatch.filter(names, pattern)]
+
+
 def list_files_in_directory(directory_path: str, pattern: str, alphabetic_index: bool,
                              endings=('.jpeg', '.jpg', '.png', '.tiff', '.gif', '.bmp', '.webp')) -> Dict[int, List[str]]:
-    if not os.path.isdir(directory_path):
+    directory_path = os.path.abspath(directory_path)
+    try:
+        names, subdirectories = _scan_directory(directory_path)
+    except OSError:
         return {}
-    dirs_to_search = [directory_path]
-    if os.path.isdir(os.path.join(directory_path, "batch_0001")):
+    dirs_to_search = [(directory_path, names)]
+    if "batch_0001" in subdirectories:
         dirs_to_search = list()
-        for i in range(10000):
-            dirpath = os.path.join(directory_path, "batch_" + (str(i).zfill(4)))
-            if not os.path.isdir(dirpath):
+        for i in range(1, 10000):
+            dirname = "batch_" + (str(i).zfill(4))
+            if dirname not in subdirectories:
                 break
-            else:
-                dirs_to_search.append(dirpath)
+            dirpath = os.path.join(directory_path, dirname)
+            dirs_to_search.append((dirpath, _scan_directory(dirpath)[0]))
 
     def _num_from_filename(fn):
         (text, _) = os.path.splitext(fn)
@@ -43,9 +84,9 @@ def list_files_in_directory(directory_path: str, pattern: str, alphabetic_index:
             return -1
 
     result = dict()
-    for search_path in dirs_to_search:
+    for search_path, names in dirs_to_search:
         files = []
-        for file_name in glob.glob(os.path.join(search_path, pattern), recursive=False):
+        for file_name in _match_in_directory(search_path, pattern, names):
             if (endings is None) or file_name.lower().endswith(endings):
                 files.append(os.path.abspath(file_name))
 
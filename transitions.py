@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import torch
+
 from .categories import *
 from .core import *
 
@@ -9,29 +11,21 @@ class FadeProc:
         self._fade_len = fade_length
         self._start_v = start_v
         self._end_v = end_v
-        self._delta = (self._end_v - self._start_v) / (abs(self._fade_len))
+        self._delta = (self._end_v - self._start_v) / max(1, abs(self._fade_len))
 
-    def proc(self, n: int, total: int, im: DVB_Image, *a, **args) -> DVB_Image:
+    def gains(self, total: int) -> torch.Tensor:
         if self._start_v > self._end_v:
             # fade out (1.0, 0.75, 0.5, 0.25, 0) (len 4)
             end = total - 1
             start = max(total - 1 - abs(self._fade_len), 0)
-            if start <= n <= end:
-                i = n - start
-                m = self._start_v + i * self._delta
-                return im.change_brightness(m)
-            else:
-                return im
         else:
             # fade in (0, 0.25, 0.5, 0.75, 1.0) (len 4)
             start = 0
             end = min(total - 1, abs(self._fade_len))
-            if start <= n <= end:
-                i = n - start
-                m = self._start_v + i * self._delta
-                return im.change_brightness(m)
-            else:
-                return im
+        gains = torch.ones(total)
+        if total > 0:
+            gains[start:end + 1] = self._start_v + torch.arange(end + 1 - start) * self._delta
+        return gains
 
 
 class DVB_FadeToBlack:
@@ -55,10 +49,9 @@ class DVB_FadeToBlack:
     def result(self, frames: FrameSet, fade_seconds: float):
         assert isinstance(frames, FrameSet)
         gc_comfyui()
-        proc = DVB_ImageBatchProcessor(frames.tensor)
         fade_length = frames.framerate.seconds_to_frames(fade_seconds)
         fade = FadeProc(fade_length, 1.0, 0.0)
-        return (FrameSet(tensor=proc.process(fade.proc), framerate=frames.framerate, indices=frames.indices),)
+        return (frames.faded(fade.gains(len(frames))),)
 
 
 class DVB_FadeFromBlack:
@@ -82,10 +75,9 @@ class DVB_FadeFromBlack:
     def result(self, frames: FrameSet, fade_seconds: float):
         assert isinstance(frames, FrameSet)
         gc_comfyui()
-        proc = DVB_ImageBatchProcessor(frames.tensor)
         fade_length = frames.framerate.seconds_to_frames(fade_seconds)
         fade = FadeProc(fade_length, 0.0, 1.0)
-        return (FrameSet(tensor=proc.process(fade.proc), framerate=frames.framerate, indices=frames.indices),)
+        return (frames.faded(fade.gains(len(frames))),)
 
 
 class DVB_BlendedTransition:
@@ -107,6 +99,7 @@ class DVB_BlendedTransition:
     RETURN_NAMES = ("frames",)
     FUNCTION = "result"
 
+    @cached_result
     def result(self, frames_first: FrameSet, frames_after: FrameSet, fade_seconds):
         assert isinstance(frames_first, FrameSet)
         assert isinstance(frames_after, FrameSet)
@@ -114,12 +114,13 @@ class DVB_ForEachFilename:
         search_path = os.path.normpath(os.path.abspath(directory))
         state = ForEachState(statefile)
 
-        files = list(filter(lambda f: not f.endswith(foreach_filename), glob.glob(os.path.join(search_path, pattern), recursive=True)))
+        files = list(filter(lambda f: not os.path.basename(f).startswith(foreach_filename), glob.glob(os.path.join(search_path, pattern), recursive=True)))
         state.add_files_to_process(files)
 
         next_path = state.pop()
         if next_path is None:
-            os.unlink(statefile)
+            if not state.remove_if_complete():
+                on_node_error(DVB_ForEachFilename, "All remaining files are claimed by other workers.")
             on_node_error(DVB_ForEachFilename, "No more files to process.")
         name, _ = os.path.splitext(os.path.basename(next_path))
         return (next_path, name, statefile)
@@ -169,8 +170,14 @@ class DVB_ForEachCheckpoint:
 
     def exec(self, image, foreach):
         state = ForEachState(foreach)
-        next_file = state.pop()
-        state.mark_done(next_file)
+        claimed = state.claimed_by()
+        if claimed is None:
+            on_node_error(DVB_ForEachCheckpoint, "No unfinished file is claimed by this worker.")
+        owner = state.claim_owner(claimed)
+        if owner != worker_id():
+            on_node_error(DVB_ForEachCheckpoint, "Lease on {} expired and the file was claimed by {}.".format(
+                claimed, owner))
+        state.mark_done(claimed)
         return tuple()
 
 
@@ -269,7 +276,8 @@ class DVB_TraceMalloc:
         import tracemalloc, gc
 
         print("!! Forcing GC")
-        gc_comfyui()
+        gc_comfyui(force=True)
+        print("!! GC statistics: " + str(memory_policy().statistics()))
         gc.collect()
         if not tracemalloc.is_tracing():
             print("!! TRACEMALLOC INIT")
@@ -51,10 +51,11 @@ class DVB_UnwrapFrameSet:
     FUNCTION = "work"
 
     def work(self, frames: FrameSet, gap_mode: str):
-        images = frames.images
         if gap_mode == "FAIL" and frames.has_index_gaps():
             on_node_error(DVB_ImagesToFrameSet, "Frame set contains gaps!")
         if gap_mode == "BLEND":
-            images = frames.get_blended_frame_images()
-        return (DVB_Image.join_to_tensor_data(images), frames.framerate.as_float(), frames.framerate.rounded_int(),
+            images = frames.generate_inbetween_blended().tensor
+        else:
+            images = frames.tensor
+        return (images, frames.framerate.as_float(), frames.framerate.rounded_int(),
                 frames.framerate.base, frames.framerate.divisor, frames.first_index, frames.indexed_length, len(frames))